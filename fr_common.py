@@ -0,0 +1,328 @@
+"""
+Federal Register Miner - Shared Helpers
+State, API access, story rendering and git helpers used by both miners.
+"""
+
+import requests
+import functools
+import json
+import os
+import re
+import queue
+import subprocess
+import threading
+import time
+from datetime import datetime, timedelta
+from html import escape
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+REPO_DIR = "/home/computeruse/which-ai-village-agent/opus-claude-code-news"
+STATE_FILE = os.path.join(REPO_DIR, "fr_state.json")
+PUBLISHED_LOG = os.path.join(REPO_DIR, "published_docs.jsonl")
+HTTP_CACHE_FILE = os.path.join(REPO_DIR, "fr_http_cache.json")
+DAILY_HTTP_CACHE_FILE = os.path.join(REPO_DIR, "fr_http_cache_daily.json")  # Kept apart so the daily run stays small
+API_BASE = "https://www.federalregister.gov/api/v1/documents.json"
+IMMUTABLE_AFTER_DAYS = 7  # Back-issues older than this are never refetched once cached
+MAX_WORKERS = 8  # Concurrent dates in flight; keeps us polite to the FR API
+MAX_REQUESTS_PER_SECOND = 10  # Shared by every fetch thread
+RATE_LIMIT_FLOOR = MAX_WORKERS  # Pause at this much quota; other threads may have requests in flight
+RATE_LIMIT_MAX_WAIT = 60  # Seconds
+
+# Fields requested from the API; the only ones create_story_html reads
+_DOC_FIELDS = ("title", "type", "abstract", "publication_date", "document_number", "html_url", "agencies")
+_SLUG_STRIP = re.compile(r'[^a-z0-9\s-]')
+_SLUG_DASH = re.compile(r'[\s_-]+')
+_STORY_NUM = re.compile(r'story-(\d+)')
+
+# One keep-alive session for every API call, retrying transient failures with backoff
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_maxsize=MAX_WORKERS, max_retries=Retry(
+    total=3, backoff_factor=0.5, status_forcelist=[429, 502, 503])))
+
+def write_atomic(path, content):
+    """Write a file via a temp file and rename, so it is either complete or absent."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def load_published_docs():
+    """Load every published document number from the append-only log."""
+    if not os.path.exists(PUBLISHED_LOG):
+        return set()
+    with open(PUBLISHED_LOG, 'r') as f:
+        return {json.loads(line) for line in f if line.strip()}
+
+def load_state():
+    """Load published document numbers to avoid duplicates."""
+    if os.path.exists(STATE_FILE):
+        with open(STATE_FILE, 'r') as f:
+            state = json.load(f)
+        state['completed_dates'] = set(state.get('completed_dates', []))
+    else:
+        state = {"completed_dates": set(), "next_story_num": get_next_story_num()}
+    
+    # A plain set already answers membership with one C-level hash and probe;
+    # a Python-side Bloom filter in front of it would only add hashing.
+    published = load_published_docs()
+    # Docs published since the last save; only these are appended to PUBLISHED_LOG.
+    # Older state files keep the full list inline; move it to the log on the next save.
+    state['unsaved_docs'] = [d for d in state.pop('published_docs', []) if d not in published]
+    state['published_docs'] = published.union(state['unsaved_docs'])
+    return state
+
+def mark_published(state, doc_num):
+    """Record a document as published."""
+    state['published_docs'].add(doc_num)
+    state['unsaved_docs'].append(doc_num)
+
+def save_state(state):
+    """Save state to file, appending newly published docs to the log."""
+    if state['unsaved_docs']:
+        with open(PUBLISHED_LOG, 'a') as f:
+            f.writelines(json.dumps(doc_num) + '\n' for doc_num in state['unsaved_docs'])
+        state['unsaved_docs'].clear()
+    
+    with open(STATE_FILE, 'w') as f:
+        json.dump({**{k: v for k, v in state.items() if k not in ('published_docs', 'unsaved_docs')},
+                   'completed_dates': sorted(state['completed_dates'])}, f, indent=2)
+
+def load_http_cache(path=HTTP_CACHE_FILE):
+    """Load cached API pages keyed by "date:page"; a damaged cache counts as empty."""
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            try:
+                return json.load(f)
+            except json.JSONDecodeError:
+                print(f"Ignoring unreadable HTTP cache {path}")
+    return {}
+
+def save_http_cache(cache, oldest_date, completed_dates=(), path=HTTP_CACHE_FILE):
+    """Save cached API pages, dropping dates before oldest_date or already fully mined."""
+    for key in list(cache):
+        date = key.split(':', 1)[0]
+        if date < oldest_date or date in completed_dates:
+            del cache[key]
+    write_atomic(path, json.dumps(cache))
+
+def get_next_story_num():
+    """Get the next available story number."""
+    best = 0
+    with os.scandir(REPO_DIR) as entries:
+        for entry in entries:
+            name = entry.name
+            if name.endswith(".html"):
+                match = _STORY_NUM.match(name)
+                if match:
+                    best = max(best, int(match.group(1)))
+    return best + 1
+
+@functools.lru_cache(maxsize=4096)
+def slugify(title):
+    """Convert title to URL-friendly slug."""
+    slug = title.lower()
+    slug = _SLUG_STRIP.sub('', slug)
+    slug = _SLUG_DASH.sub('-', slug)
+    slug = slug.strip('-')
+    return slug[:50]
+
+_throttle_lock = threading.Lock()
+_next_request_at = 0.0
+
+def throttle():
+    """Space API requests at least 1/MAX_REQUESTS_PER_SECOND apart across all threads."""
+    global _next_request_at
+    with _throttle_lock:
+        now = time.monotonic()
+        wait = _next_request_at - now
+        _next_request_at = max(now, _next_request_at) + 1 / MAX_REQUESTS_PER_SECOND
+    if wait > 0:
+        time.sleep(wait)
+
+def wait_for_rate_limit(response):
+    """Sleep until the rate-limit window resets if the API reports the quota nearly spent.
+    
+    429s and Retry-After are handled by the session's Retry with backoff.
+    """
+    try:
+        remaining = int(response.headers['X-RateLimit-Remaining'])
+        reset = float(response.headers['X-RateLimit-Reset'])
+    except (KeyError, ValueError):
+        return
+    if remaining > RATE_LIMIT_FLOOR:
+        return
+    
+    # Reset may be an epoch timestamp or a number of seconds from now
+    delay = reset - time.time() if reset > 1e9 else reset
+    if delay > 0:
+        time.sleep(min(delay, RATE_LIMIT_MAX_WAIT))
+
+def trim_results(data):
+    """Keep only _DOC_FIELDS in each result of a cached page.
+    
+    fields[] already asks the API for just these, but cache entries written
+    before it was sent still hold full documents.
+    """
+    data['results'] = [{k: doc[k] for k in _DOC_FIELDS if k in doc} for doc in data.get('results', [])]
+    return data
+
+def fetch_documents(date=None, per_page=100, page=1, cache=None):
+    """Fetch documents from Federal Register API."""
+    params = {
+        "per_page": per_page,
+        "page": page,
+        "order": "newest",
+        "fields[]": list(_DOC_FIELDS),
+    }
+    if date:
+        params["conditions[publication_date][is]"] = date
+    
+    # Pages are cached per date with their ETag so re-runs can revalidate cheaply
+    key = f"{date}:{page}"
+    cached = cache.get(key) if cache is not None and date else None
+    headers = {}
+    if cached:
+        cutoff = (datetime.now() - timedelta(days=IMMUTABLE_AFTER_DAYS)).strftime('%Y-%m-%d')
+        if date < cutoff:
+            return trim_results(cached['body'])
+        if cached.get('etag'):
+            headers["If-None-Match"] = cached['etag']
+    
+    throttle()
+    response = _SESSION.get(API_BASE, params=params, headers=headers, timeout=30)
+    wait_for_rate_limit(response)
+    if cached and response.status_code == 304:
+        return trim_results(cached['body'])
+    response.raise_for_status()
+    data = response.json()
+    if cache is not None and date:
+        cache[key] = {"etag": response.headers.get('ETag'), "body": data}
+    return data
+
+_writer_q = queue.Queue(maxsize=256)
+_writer_errors = []  # Failed writes, re-raised by flush_writes before state is saved
+
+def _writer_loop():
+    """Write queued story files so mining doesn't wait on disk."""
+    while True:
+        filepath, html_content = _writer_q.get()
+        try:
+            write_atomic(filepath, html_content)
+        except Exception as e:  # Anything escaping would kill the thread and hang flush_writes
+            _writer_errors.append(e)
+        finally:
+            _writer_q.task_done()
+
+threading.Thread(target=_writer_loop, daemon=True).start()
+
+def flush_writes():
+    """Block until every queued story file has been written.
+    
+    Raises the first write error, so callers never save state for a story
+    whose file is missing.
+    """
+    _writer_q.join()
+    if _writer_errors:
+        error = _writer_errors[0]
+        _writer_errors.clear()
+        raise error
+
+_STORY_TEMPLATE = '''<!DOCTYPE html>
+<html>
+<head>
+    <title>BREAKING: {headline}</title>
+    <meta charset="UTF-8">
+    <style>
+        body {{ font-family: Georgia, serif; max-width: 800px; margin: 0 auto; padding: 20px; }}
+        h1 {{ border-bottom: 2px solid #333; }}
+        .breaking {{ background: #fff3cd; border-left: 4px solid #dc3545; padding: 15px; }}
+        .source {{ background: #f8f9fa; padding: 10px; margin-top: 20px; font-size: 0.9em; }}
+        .timestamp {{ color: #666; }}
+    </style>
+</head>
+<body>
+    <h1>BREAKING: {headline}</h1>
+    <p class="timestamp">Published: {published} | Source: Federal Register</p>
+    <div class="breaking">
+        <p><strong>{summary}</strong></p>
+    </div>
+    <h2>Document Details</h2>
+    <p><strong>Document Type:</strong> {doc_type}</p>
+    <p><strong>Agency:</strong> {agency_names}</p>
+    <p><strong>Document Number:</strong> {doc_num}</p>
+    <p><strong>Publication Date:</strong> {pub_date}</p>
+    <h2>Official Source</h2>
+    <p>Read the full document at: <a href="{html_url}">{html_url}</a></p>
+    <div class="source"><strong>Source:</strong> Federal Register - {doc_num}</div>
+    <p><a href="index.html">← Back to Breaking News Wire</a></p>
+</body>
+</html>
+'''
+
+def story_file_matches(filepath, doc_num):
+    """Check whether filepath is an existing story page for doc_num.
+    
+    Writes are atomic, so an existing file is complete, but the same story
+    number and slug can belong to a different document after a re-run.
+    """
+    if not os.path.exists(filepath):
+        return False
+    with open(filepath, 'r', encoding='utf-8', errors='replace') as f:
+        return f"<strong>Document Number:</strong> {escape(doc_num)}</p>" in f.read()
+
+def create_story_html(doc, story_num, published=None):
+    """Create HTML file for a Federal Register document.
+    
+    The page is stamped with `published`, defaulting to the document's publication date.
+    """
+    title = doc.get('title', 'Untitled')
+    
+    # Create headline
+    headline = f"Federal Register: {title}"
+    
+    slug = slugify(title)
+    filename = f"story-{story_num:03d}-fr-{slug}.html"
+    filepath = os.path.join(REPO_DIR, filename)
+    
+    doc_num = doc.get('document_number', '')
+    
+    # Already written for this document by an earlier, interrupted run
+    if story_file_matches(filepath, doc_num):
+        return filename, headline
+    
+    doc_type = doc.get('type', 'Document')
+    abstract = doc.get('abstract', '') or ''
+    pub_date = doc.get('publication_date', '')
+    html_url = doc.get('html_url', '')
+    agencies = doc.get('agencies', [])
+    agency_names = ', '.join([a.get('name', '') for a in agencies]) or 'Federal Government'
+    
+    # Build summary
+    if abstract:
+        summary = abstract[:500] + "..." if len(abstract) > 500 else abstract
+    else:
+        summary = f"The Federal Register has published a new {doc_type} from {agency_names}."
+    
+    html_content = _STORY_TEMPLATE.format(
+        headline=escape(headline),
+        published=escape(published or pub_date),
+        summary=escape(summary),
+        doc_type=escape(doc_type),
+        agency_names=escape(agency_names),
+        doc_num=escape(doc_num),
+        pub_date=escape(pub_date),
+        html_url=escape(html_url),
+    )
+    _writer_q.put((filepath, html_content))
+    
+    return filename, headline
+
+def git_commit(message, paths):
+    """Commit the given files (relative to REPO_DIR)."""
+    subprocess.run(["git", "-C", REPO_DIR, "add", *paths], check=True)
+    subprocess.run(["git", "-C", REPO_DIR, "commit", "-m", message], check=True)
+
+def git_push():
+    """Push committed changes."""
+    subprocess.run(["git", "-C", REPO_DIR, "push"], check=True)
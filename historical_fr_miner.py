@@ -4,190 +4,128 @@ Historical Federal Register Batch Miner
 Mines multiple dates of Federal Register documents.
 """
 
-import requests
-import json
 import os
-import time
-import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
-REPO_DIR = "/home/computeruse/which-ai-village-agent/opus-claude-code-news"
-STATE_FILE = os.path.join(REPO_DIR, "fr_state.json")
-API_BASE = "https://www.federalregister.gov/api/v1/documents.json"
+from fr_common import (
+    MAX_WORKERS, STATE_FILE, PUBLISHED_LOG,
+    load_state, save_state, mark_published, load_http_cache, save_http_cache, get_next_story_num,
+    fetch_documents, create_story_html, flush_writes, git_commit, git_push,
+)
 
-def load_state():
-    if os.path.exists(STATE_FILE):
-        with open(STATE_FILE, 'r') as f:
-            return json.load(f)
-    return {"published_docs": [], "next_story_num": 547}
-
-def save_state(state):
-    with open(STATE_FILE, 'w') as f:
-        json.dump(state, f, indent=2)
-
-def get_next_story_num():
-    existing = [f for f in os.listdir(REPO_DIR) if f.startswith("story-") and f.endswith(".html")]
-    if not existing:
-        return 1
-    nums = []
-    for f in existing:
-        match = re.match(r'story-(\d+)', f)
-        if match:
-            nums.append(int(match.group(1)))
-    return max(nums) + 1 if nums else 1
-
-def slugify(title):
-    slug = title.lower()
-    slug = re.sub(r'[^a-z0-9\s-]', '', slug)
-    slug = re.sub(r'[\s_-]+', '-', slug)
-    slug = slug.strip('-')
-    return slug[:50]
-
-def fetch_documents(date=None, per_page=100, page=1):
-    params = {
-        "per_page": per_page,
-        "page": page,
-        "order": "newest"
-    }
-    if date:
-        params["conditions[publication_date][is]"] = date
-    
-    response = requests.get(API_BASE, params=params, timeout=30)
-    response.raise_for_status()
-    return response.json()
-
-def create_story_html(doc, story_num):
-    title = doc.get('title', 'Untitled')
-    doc_type = doc.get('type', 'Document')
-    abstract = doc.get('abstract', '') or ''
-    pub_date = doc.get('publication_date', '')
-    doc_num = doc.get('document_number', '')
-    html_url = doc.get('html_url', '')
-    agencies = doc.get('agencies', [])
-    agency_names = ', '.join([a.get('name', '') for a in agencies]) or 'Federal Government'
-    
-    headline = f"Federal Register: {title}"
-    
-    if abstract:
-        summary = abstract[:500] + "..." if len(abstract) > 500 else abstract
-    else:
-        summary = f"The Federal Register has published a new {doc_type} from {agency_names}."
+def fetch_date_all(date_str, cache=None):
+    """Fetch every page of documents for a specific date.
     
-    slug = slugify(title)
-    filename = f"story-{story_num:03d}-fr-{slug}.html"
-    
-    html_content = f'''<!DOCTYPE html>
-<html>
-<head>
-    <title>BREAKING: {headline}</title>
-    <meta charset="UTF-8">
-    <style>
-        body {{ font-family: Georgia, serif; max-width: 800px; margin: 0 auto; padding: 20px; }}
-        h1 {{ border-bottom: 2px solid #333; }}
-        .breaking {{ background: #fff3cd; border-left: 4px solid #dc3545; padding: 15px; }}
-        .source {{ background: #f8f9fa; padding: 10px; margin-top: 20px; font-size: 0.9em; }}
-        .timestamp {{ color: #666; }}
-    </style>
-</head>
-<body>
-    <h1>BREAKING: {headline}</h1>
-    <p class="timestamp">Published: {pub_date} | Source: Federal Register</p>
-    <div class="breaking">
-        <p><strong>{summary}</strong></p>
-    </div>
-    <h2>Document Details</h2>
-    <p><strong>Document Type:</strong> {doc_type}</p>
-    <p><strong>Agency:</strong> {agency_names}</p>
-    <p><strong>Document Number:</strong> {doc_num}</p>
-    <p><strong>Publication Date:</strong> {pub_date}</p>
-    <h2>Official Source</h2>
-    <p>Read the full document at: <a href="{html_url}">{html_url}</a></p>
-    <div class="source"><strong>Source:</strong> Federal Register - {doc_num}</div>
-    <p><a href="index.html">← Back to Breaking News Wire</a></p>
-</body>
-</html>
-'''
-    
-    filepath = os.path.join(REPO_DIR, filename)
-    with open(filepath, 'w') as f:
-        f.write(html_content)
-    
-    return filename, headline
-
-def mine_date_all(date_str, state):
-    """Mine ALL documents from a specific date."""
-    print(f"Mining Federal Register for {date_str}...")
-    
-    new_stories = []
+    Returns (docs, complete) where complete is False if a page failed.
+    """
+    docs = []
     page = 1
     
     while True:
         try:
-            data = fetch_documents(date=date_str, per_page=100, page=page)
+            data = fetch_documents(date=date_str, per_page=100, page=page, cache=cache)
             results = data.get('results', [])
             
             if not results:
                 break
             
-            for doc in results:
-                doc_num = doc.get('document_number', '')
-                if doc_num in state['published_docs']:
-                    continue
-                
-                story_num = state['next_story_num']
-                filename, headline = create_story_html(doc, story_num)
-                new_stories.append((filename, headline))
-                state['published_docs'].append(doc_num)
-                state['next_story_num'] += 1
-            
+            docs.extend(results)
             page += 1
-            time.sleep(0.3)  # Rate limiting
             
             if page > data.get('total_pages', 1):
                 break
                 
         except Exception as e:
-            print(f"Error fetching page {page}: {e}")
-            break
+            print(f"Error fetching {date_str} page {page}: {e}")
+            return docs, False
+    
+    return docs, True
+
+def mine_date_all(date_str, docs, state):
+    """Mine ALL fetched documents from a specific date."""
+    print(f"Mining Federal Register for {date_str}...")
+    
+    new_stories = []
+    
+    for doc in docs:
+        doc_num = doc.get('document_number', '')
+        if doc_num in state['published_docs']:
+            continue
+        
+        story_num = state['next_story_num']
+        filename, headline = create_story_html(doc, story_num)
+        new_stories.append((filename, headline))
+        mark_published(state, doc_num)
+        state['next_story_num'] += 1
     
     print(f"  -> {len(new_stories)} new documents")
     return new_stories
 
-def git_commit_push(message):
-    os.system(f'cd {REPO_DIR} && git add -A && git commit -m "{message}" && git push')
+def commit_batch(batch_stories):
+    """Commit a batch of new story files along with the state file."""
+    paths = [filename for filename, _ in batch_stories]
+    paths += [os.path.basename(STATE_FILE), os.path.basename(PUBLISHED_LOG)]
+    git_commit(f"Federal Register historical batch: {len(batch_stories)} documents", paths)
 
-def main(days_back=30, batch_commit_size=100):
+def main(days_back=30, batch_commit_size=100, reconcile=False):
     """Mine historical Federal Register documents."""
     state = load_state()
-    state['next_story_num'] = get_next_story_num()
+    if reconcile:
+        state['next_story_num'] = get_next_story_num()
+    http_cache = load_http_cache()
     
     total_new = 0
     batch_stories = []
+    uncommitted_dates = 0  # Dates marked complete since the state file was last committed
     
-    # Mine documents from past N days
-    for i in range(days_back):
-        date = (datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d')
-        new_stories = mine_date_all(date, state)
-        batch_stories.extend(new_stories)
-        total_new += len(new_stories)
-        
-        # Commit in batches
-        if len(batch_stories) >= batch_commit_size:
-            save_state(state)
-            git_commit_push(f"Federal Register historical batch: {len(batch_stories)} documents")
-            print(f"Committed batch of {len(batch_stories)} stories. Total: {total_new}")
-            batch_stories = []
+    today = datetime.now().strftime('%Y-%m-%d')
+    dates = [(datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days_back)]
+    oldest_date = dates[-1] if dates else today
+    dates = [d for d in dates if d not in state['completed_dates']]
+    
+    # Fetch dates concurrently; stories are still created in date order on this thread
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        for date, (docs, complete) in zip(dates, pool.map(lambda d: fetch_date_all(d, http_cache), dates)):
+            new_stories = mine_date_all(date, docs, state)
+            
+            # A past date walked cleanly with nothing new has been fully mined
+            if complete and not new_stories and date < today:
+                state['completed_dates'].add(date)
+                uncommitted_dates += 1
+            
+            batch_stories.extend(new_stories)
+            total_new += len(new_stories)
+            
+            # Commit in batches
+            if len(batch_stories) >= batch_commit_size:
+                flush_writes()
+                save_state(state)
+                commit_batch(batch_stories)
+                print(f"Committed batch of {len(batch_stories)} stories. Total: {total_new}")
+                batch_stories = []
+                uncommitted_dates = 0
+    save_http_cache(http_cache, oldest_date, state['completed_dates'])
+    flush_writes()
+    save_state(state)  # Persist completed_dates even when nothing new was found
     
     # Final commit for remaining
     if batch_stories:
-        save_state(state)
-        git_commit_push(f"Federal Register historical batch: {len(batch_stories)} documents")
+        commit_batch(batch_stories)
         print(f"Final batch: {len(batch_stories)} stories. Total: {total_new}")
+    elif uncommitted_dates:
+        git_commit(f"Federal Register historical: {uncommitted_dates} dates fully mined",
+                   [os.path.basename(STATE_FILE)])
+    
+    # Push all batch commits in one go
+    if total_new or uncommitted_dates:
+        git_push()
     
     print(f"\n=== COMPLETE: Published {total_new} new Federal Register documents ===")
     return total_new
 
 if __name__ == "__main__":
     import sys
-    days = int(sys.argv[1]) if len(sys.argv) > 1 else 7
-    main(days_back=days)
+    args = [a for a in sys.argv[1:] if a != "--reconcile"]
+    days = int(args[0]) if args else 7
+    main(days_back=days, reconcile="--reconcile" in sys.argv)